@@ -1,25 +1,39 @@
-from flask import Flask, request, jsonify, send_file
-from flask_cors import CORS
+from quart import Quart, request, jsonify, send_file
+from quart.json.provider import JSONProvider
+from quart_cors import cors
 import google.generativeai as genai
 from dotenv import load_dotenv
+import asyncio
+import concurrent.futures
+import functools
+import hashlib
 import os
-import json
 import logging
+import logging.handlers
+import queue
 import re
-import uuid
+import regex
+import cachetools
+import fastjsonschema
 import fitz  # PyMuPDF
-import shutil
-from werkzeug.utils import secure_filename
-from datetime import datetime
+import numpy as np
+import orjson
 
-# Set up logging
+# Set up logging; records are enqueued by the request handlers and written to
+# disk by a background listener thread, so logging never blocks a request on
+# file IO
 log_dir = os.path.join(os.path.dirname(__file__), 'logs')
 os.makedirs(log_dir, exist_ok=True)
-logging.basicConfig(
-    filename=os.path.join(log_dir, 'prompt_errors.log'),
-    level=logging.ERROR,
-    format='%(asctime)s - %(levelname)s - %(message)s'
+_log_queue = queue.Queue(-1)
+_log_file_handler = logging.FileHandler(os.path.join(log_dir, 'prompt_errors.log'))
+_log_file_handler.setFormatter(
+    logging.Formatter('%(asctime)s - %(levelname)s - %(message)s')
 )
+_log_listener = logging.handlers.QueueListener(_log_queue, _log_file_handler)
+_log_listener.start()
+_root_logger = logging.getLogger()
+_root_logger.setLevel(logging.ERROR)
+_root_logger.addHandler(logging.handlers.QueueHandler(_log_queue))
 
 # Load environment variables and configure API
 load_dotenv()
@@ -28,57 +42,341 @@ if not api_key:
     logging.error("GOOGLE_API_KEY not found in .env file")
     raise ValueError("GOOGLE_API_KEY not found in .env file")
 
+# The default grpc_asyncio transport keeps one persistent channel reused
+# across requests; the rest transport must be avoided here, as its async
+# calls run blocking requests IO on the event loop
 genai.configure(api_key=api_key)
 model = genai.GenerativeModel('gemini-1.5-flash')
 
+# Maps curly/smart quotes to their ASCII equivalents in one C-level pass
+_QUOTE_TRANS = str.maketrans({
+    "“": '"',
+    "”": '"',
+    "‘": "'",
+    "’": "'",
+})
+
+# Precompiled regex patterns for JSON extraction/repair (hot path on every request)
+_JSON_ARRAY_RE = re.compile(r'\[\s*\{.*\}\s*\]', re.DOTALL)
+
+# Unquoted keys and trailing commas are repaired in one scan: a single
+# alternation (regex module) instead of two chained re.sub passes
+_FIX_RE = regex.compile(
+    r'(?P<key>[{,])\s*(?P<name>[A-Za-z0-9_]+)\s*:'
+    r'|,\s*(?P<close>[\]}])'
+)
+
+def _fix_repl(match):
+    if match['name'] is not None:
+        return f'{match["key"]} "{match["name"]}":'
+    return match['close']
+
+# Compiled once at import; validates a well-formed quiz in a single call so the
+# Python repair loop only runs for malformed responses
+_QUIZ_VALIDATOR = fastjsonschema.compile({
+    "type": "array",
+    "minItems": 1,
+    "maxItems": 10,
+    "items": {
+        "type": "object",
+        "required": ["question", "options", "correct"],
+        "properties": {
+            "question": {"type": "string"},
+            "options": {
+                "type": "array",
+                "minItems": 2,
+                "maxItems": 4,
+                "items": {"type": "string"}
+            },
+            "correct": {"type": "string"}
+        }
+    }
+})
+
+# Static prompt scaffolding, assembled once at import so request handlers only
+# concatenate the user text
+_PROMPT_RULES = """
+
+Return the quiz in ONLY this JSON format with no other text:
+[
+    {
+        "question": "Question text here?",
+        "options": ["Option A", "Option B", "Option C", "Option D"],
+        "correct": "Option that is correct (must match exactly one item in options array)"
+    },
+    ... 9 more similar question objects
+]
+
+Important rules:
+1. Return EXACTLY 10 questions
+2. Each question MUST have EXACTLY 4 options
+3. The correct answer MUST be one of the options
+4. DO NOT include any markdown formatting, explanations, or any text outside the JSON array
+5. Use simple JSON without any special formatting
+"""
+
+_TEXT_PROMPT_HEAD = "Create a quiz with 10 multiple-choice questions based on this text: "
+
+# Very short inputs are treated as a topic rather than source text
+_TOPIC_PROMPT_HEAD = "Create a quiz with 10 multiple-choice questions "
+
+_PDF_PROMPT_HEAD = "Create a quiz with 10 multiple-choice questions based on this text extracted from a PDF:\n"
+
 # Ensure quizzes directory exists
 quizzes_dir = os.path.join(os.path.dirname(__file__), 'quizzes')
 os.makedirs(quizzes_dir, exist_ok=True)
+_QUIZ_PATH = os.path.join(quizzes_dir, 'generated_quiz.json')
+
+# Quiz persistence happens on this pool so responses aren't blocked on disk
+# IO; a single worker serializes writes, since concurrent truncate/write of
+# the one output file would corrupt it
+_quiz_writer = concurrent.futures.ThreadPoolExecutor(max_workers=1)
+
+def _write_quiz(quiz):
+    """Persist the generated quiz to disk (runs on the writer pool)."""
+    try:
+        with open(_QUIZ_PATH, 'wb') as f:
+            f.write(orjson.dumps(quiz, option=orjson.OPT_INDENT_2))
+    except Exception as e:
+        logging.error(f"Failed to save quiz to file: {str(e)}")
+
+class LLMCache:
+    """Two-tier cache for generated quizzes.
+
+    Exact tier: TTL cache keyed by sha256 of the input text.
+    Semantic tier: embedding comparison so near-duplicate inputs
+    (cosine similarity above the threshold) reuse a stored quiz.
+    """
+
+    def __init__(self, maxsize=1024, ttl=3600, similarity_threshold=0.92):
+        self._exact = cachetools.TTLCache(maxsize=maxsize, ttl=ttl)
+        self._semantic = []  # list of (embedding, quiz) pairs
+        self._maxsize = maxsize
+        self._threshold = similarity_threshold
+
+    @staticmethod
+    def _key(text):
+        return hashlib.sha256(text.encode()).hexdigest()
+
+    @staticmethod
+    async def _embed(text):
+        """Embed text for the semantic tier; returns None if embedding fails."""
+        try:
+            result = await genai.embed_content_async(
+                model='models/text-embedding-004',
+                content=text
+            )
+            return np.asarray(result['embedding'])
+        except Exception as e:
+            logging.error(f"Embedding error: {str(e)}")
+            return None
+
+    async def get(self, text):
+        """Look up a cached quiz for this text.
+
+        Returns a (quiz, embedding) pair; quiz is None on a miss. The
+        embedding (when one was computed) is handed back so callers can pass
+        it to put without paying a second embedding round-trip.
+        """
+        quiz = self._exact.get(self._key(text))
+        if quiz is not None:
+            return quiz, None
+
+        # Nothing to compare against yet: skip the embedding round-trip
+        if not self._semantic:
+            return None, None
+
+        embedding = await self._embed(text)
+        if embedding is None:
+            return None, None
+        norm = np.linalg.norm(embedding)
+        for stored_embedding, stored_quiz in self._semantic:
+            score = np.dot(embedding, stored_embedding) / (norm * np.linalg.norm(stored_embedding))
+            if score > self._threshold:
+                return stored_quiz, embedding
+        return None, embedding
+
+    async def put(self, text, quiz, embedding=None):
+        """Store a freshly generated quiz in both tiers.
+
+        Runs as a background task off the response path; embeds the text only
+        when get didn't already do so.
+        """
+        self._exact[self._key(text)] = quiz
+
+        if embedding is None:
+            embedding = await self._embed(text)
+        if embedding is not None:
+            if len(self._semantic) >= self._maxsize:
+                self._semantic.pop(0)
+            self._semantic.append((embedding, quiz))
+
+quiz_cache = LLMCache()
 
-# Ensure uploads directory exists
-uploads_dir = os.path.join(os.path.dirname(__file__), 'uploads')
-os.makedirs(uploads_dir, exist_ok=True)
+# Cap outstanding Gemini calls per worker and bound each attempt so a hung
+# request can't hold the retry loop forever
+_GEMINI_SEMAPHORE_LIMIT = 8
+_GEMINI_TIMEOUT_SECONDS = 60
+_gemini_semaphore = asyncio.Semaphore(_GEMINI_SEMAPHORE_LIMIT)
 
-# Flask app
-app = Flask(__name__)
-CORS(app)
+async def _generate_content(prompt):
+    """Call Gemini asynchronously, rate-capped and with a per-attempt timeout."""
+    async with _gemini_semaphore:
+        return await asyncio.wait_for(
+            model.generate_content_async(
+                prompt,
+                generation_config={"temperature": 0.2}  # Lower temperature for more consistent formatting
+            ),
+            timeout=_GEMINI_TIMEOUT_SECONDS
+        )
+
+# Batch coalescing: queued quiz requests are merged into a single Gemini call,
+# amortizing the per-call network and token overhead across the batch
+_BATCH_WINDOW_SECONDS = 0.05
+_BATCH_MAX_SIZE = 5
+_batch_queue = None  # created at startup so it binds to the serving event loop
+
+_BATCH_PROMPT_RULES = """
+
+Return ONLY a JSON array with one object per numbered text, in this format:
+[
+    {"id": 0, "quiz": [{"question": "...?", "options": ["A", "B", "C", "D"], "correct": "A"}, ...]},
+    ... one object per text
+]
+
+Important rules:
+1. Include one object for every numbered text, with its "id"
+2. Each quiz MUST have EXACTLY 10 questions
+3. Each question MUST have EXACTLY 4 options
+4. The correct answer MUST be one of the options
+5. DO NOT include any markdown formatting, explanations, or any text outside the JSON array
+"""
+
+async def _process_batch(batch):
+    """Send one Gemini request for a batch of texts and fan out the results."""
+    numbered = "\n\n".join(
+        f"Text {i}:\n{text}" for i, (text, _) in enumerate(batch)
+    )
+    prompt = (
+        "Create a quiz with 10 multiple-choice questions for EACH of the "
+        f"following {len(batch)} numbered texts.\n\n{numbered}{_BATCH_PROMPT_RULES}"
+    )
+
+    quizzes = {}
+    try:
+        response = await _generate_content(prompt)
+        json_text = extract_json_from_text(response.text or "")
+        if json_text:
+            for entry in orjson.loads(fix_json_format(json_text)):
+                if isinstance(entry, dict) and isinstance(entry.get("id"), int):
+                    quiz = validate_and_fix_quiz(entry.get("quiz"))
+                    if quiz:
+                        quizzes[entry["id"]] = quiz[:10]
+    except Exception as e:
+        logging.error(f"Batch generation error: {str(e)}")
+
+    for i, (text, future) in enumerate(batch):
+        if not future.done():
+            future.set_result(quizzes.get(i))
+
+# Keeps strong references to in-flight batch tasks so they aren't collected
+_batch_tasks = set()
+
+async def _drain_batch_queue():
+    """Background task: coalesce queued quiz requests into single Gemini calls."""
+    while True:
+        batch = [await _batch_queue.get()]
+        # Hold the window open briefly so back-to-back requests share one call
+        await asyncio.sleep(_BATCH_WINDOW_SECONDS)
+        while len(batch) < _BATCH_MAX_SIZE:
+            try:
+                batch.append(_batch_queue.get_nowait())
+            except asyncio.QueueEmpty:
+                break
+        # Spawn the batch and go straight back to draining; concurrency is
+        # capped by the Gemini semaphore, not by this loop
+        task = asyncio.create_task(_process_batch(batch))
+        _batch_tasks.add(task)
+        task.add_done_callback(_batch_tasks.discard)
+
+class ORJSONProvider(JSONProvider):
+    """orjson-backed provider so jsonify serializes responses in C."""
+
+    def dumps(self, object_, **kwargs):
+        return orjson.dumps(object_).decode()
+
+    def loads(self, object_, **kwargs):
+        return orjson.loads(object_)
+
+# Quart app (async Flask API) so the worker isn't blocked during Gemini round-trips
+app = Quart(__name__)
+app.json = ORJSONProvider(app)
+app = cors(app)
+
+@app.before_serving
+async def _start_batch_worker():
+    global _batch_queue
+    _batch_queue = asyncio.Queue()
+    app.add_background_task(_drain_batch_queue)
+
+@app.before_serving
+async def _warm_model():
+    # Pay the TLS handshake and auth discovery cost at startup so the first
+    # user-facing request doesn't
+    try:
+        await model.generate_content_async(
+            "ping",
+            generation_config={"max_output_tokens": 1}
+        )
+    except Exception as e:
+        logging.error(f"Model warmup failed: {str(e)}")
 
 @app.route('/')
-def root():
-    return send_file('index.html')
+async def root():
+    return await send_file('index.html')
 
 def extract_json_from_text(text):
     """Extract JSON array from text, handling various formatting issues."""
     # Try to find JSON array pattern with square brackets
-    json_pattern = r'\[\s*\{.*\}\s*\]'
-    match = re.search(json_pattern, text, re.DOTALL)
+    match = _JSON_ARRAY_RE.search(text)
     if match:
         return match.group(0)
     
     # If no match, look for the outermost square brackets
     start = text.find('[')
-    end = text.rfind(']') + 1
+    end = text.rfind(']')
     if start != -1 and end > start:
-        return text[start:end]
-    
+        return text[start:end + 1]
+
     return None
 
-def fix_json_format(json_str):
-    """Fix common JSON formatting issues in AI responses."""
+@functools.lru_cache(maxsize=256)
+def _fix_json_cached(json_str):
+    """Apply the JSON repairs; cached since retries often reprocess the same text."""
     # Replace incorrect quote characters
-    json_str = json_str.replace('"', '"').replace('"', '"')
-    json_str = json_str.replace(''', "'").replace(''', "'")
-    
-    # Fix missing quotes around keys
-    json_str = re.sub(r'(\{|\,)\s*([a-zA-Z0-9_]+)\s*:', r'\1 "\2":', json_str)
-    
-    # Fix trailing commas in arrays/objects
-    json_str = re.sub(r',\s*(\}|\])', r'\1', json_str)
-    
+    json_str = json_str.translate(_QUOTE_TRANS)
+
+    # Fix missing quotes around keys and trailing commas in one pass
+    json_str = _FIX_RE.sub(_fix_repl, json_str)
+
     return json_str
 
+def fix_json_format(json_str):
+    """Fix common JSON formatting issues in AI responses."""
+    return _fix_json_cached(json_str)
+
 def validate_and_fix_quiz(quiz):
     """Validate quiz structure and fix common issues."""
+    # Fast path: a schema-valid quiz with full option sets and matching
+    # correct answers needs no repairs
+    try:
+        _QUIZ_VALIDATOR(quiz)
+    except fastjsonschema.JsonSchemaException:
+        pass
+    else:
+        if all(len(q["options"]) == 4 and q["correct"] in q["options"] for q in quiz):
+            return quiz
+
     if not isinstance(quiz, list):
         logging.warning("Response is not a list")
         return None
@@ -134,11 +432,93 @@ def validate_and_fix_quiz(quiz):
         return valid_questions
     return None
 
+async def _call_gemini_for_quiz(prompt, fallback_topic):
+    """Run the Gemini call / extract / repair / validate loop for a quiz prompt.
+
+    Returns (quiz, None) on success, or (None, (message, status)) once all
+    attempts are exhausted. fallback_topic names the subject used when padding
+    generic questions on the final attempt.
+    """
+    attempts = 0
+    max_attempts = 3
+    while attempts < max_attempts:
+        try:
+            attempts += 1
+            response = await _generate_content(prompt)
+
+            if not response.text:
+                logging.error("Empty response from AI model")
+                if attempts < max_attempts:
+                    continue
+                return None, ("Empty response from AI model", 500)
+
+            # Extract JSON from response; no need to strip first, extraction
+            # already ignores surrounding text
+            result_text = response.text
+            json_text = extract_json_from_text(result_text)
+
+            if not json_text:
+                logging.error(f"Could not find JSON array in response: {result_text[:100]}...")
+                if attempts < max_attempts:
+                    continue
+                return None, ("Could not find JSON array in response", 500)
+
+            # Try to fix JSON formatting issues
+            json_text = fix_json_format(json_text)
+
+            # Parse JSON
+            try:
+                quiz = orjson.loads(json_text)
+            except orjson.JSONDecodeError as e:
+                logging.error(f"JSON decode error: {str(e)} in text: {json_text[:100]}...")
+                if attempts < max_attempts:
+                    continue
+                return None, ("Failed to parse AI response as JSON", 500)
+
+            # Validate and fix quiz structure
+            validated_quiz = validate_and_fix_quiz(quiz)
+            if not validated_quiz:
+                logging.error("Failed to validate quiz structure")
+                if attempts < max_attempts:
+                    continue
+                return None, ("Invalid quiz structure", 500)
+
+            # Ensure we have exactly 10 questions
+            if len(validated_quiz) < 10:
+                # If we don't have enough questions, try again
+                if attempts < max_attempts:
+                    continue
+
+                # On final attempt, pad with generic questions if needed
+                while len(validated_quiz) < 10:
+                    validated_quiz.append({
+                        "question": f"Additional question about {fallback_topic}?",
+                        "options": ["Option A", "Option B", "Option C", "Option D"],
+                        "correct": "Option A"
+                    })
+            elif len(validated_quiz) > 10:
+                # Trim excess questions
+                validated_quiz = validated_quiz[:10]
+
+            # Save quiz to file in the background; the response doesn't wait
+            # on disk, and a failed save only logs
+            _quiz_writer.submit(_write_quiz, validated_quiz)
+
+            return validated_quiz, None
+
+        except Exception as e:
+            logging.error(f"Attempt {attempts} error: {str(e)}")
+            if attempts >= max_attempts:
+                return None, ("Failed to generate quiz after multiple attempts", 500)
+            # Continue to next attempt
+
+    return None, ("Failed to generate quiz after multiple attempts", 500)
+
 @app.route('/generate-quiz', methods=['POST'])
-def generate_quiz():
+async def generate_quiz():
     try:
         # Input validation
-        data = request.get_json()
+        data = await request.get_json()
         if not data or 'text' not in data:
             return jsonify({"error": "Missing 'text' field"}), 400
 
@@ -146,129 +526,104 @@ def generate_quiz():
         if not text:
             return jsonify({"error": "Text input cannot be empty"}), 400
 
-        # Enhanced prompt with clearer formatting instructions
-        prompt = f"""
-        Create a quiz with 10 multiple-choice questions {'' if len(text.split()) <= 3 else 'based on this text:'} {text}
-        
-        Return the quiz in ONLY this JSON format with no other text:
-        [
-            {{
-                "question": "Question text here?",
-                "options": ["Option A", "Option B", "Option C", "Option D"],
-                "correct": "Option that is correct (must match exactly one item in options array)"
-            }},
-            ... 9 more similar question objects
-        ]
-        
-        Important rules:
-        1. Return EXACTLY 10 questions
-        2. Each question MUST have EXACTLY 4 options
-        3. The correct answer MUST be one of the options
-        4. DO NOT include any markdown formatting, explanations, or any text outside the JSON array
-        5. Use simple JSON without any special formatting
-        """
+        # Serve repeated (or near-duplicate) inputs from the cache
+        cached_quiz, embedding = await quiz_cache.get(text)
+        if cached_quiz is not None:
+            return jsonify(cached_quiz)
 
-        # Set safety settings for more consistent outputs
-        safety_settings = [
-            {"category": "HARM_CATEGORY_HARASSMENT", "threshold": "BLOCK_NONE"},
-            {"category": "HARM_CATEGORY_HATE_SPEECH", "threshold": "BLOCK_NONE"},
-            {"category": "HARM_CATEGORY_SEXUALLY_EXPLICIT", "threshold": "BLOCK_NONE"},
-            {"category": "HARM_CATEGORY_DANGEROUS_CONTENT", "threshold": "BLOCK_NONE"}
-        ]
-
-        # Generate quiz with extended retries
-        attempts = 0
-        max_attempts = 3
-        while attempts < max_attempts:
-            try:
-                attempts += 1
-                response = model.generate_content(
-                    prompt, 
-                    generation_config={"temperature": 0.2}  # Lower temperature for more consistent formatting
-                )
-                
-                if not response.text:
-                    logging.error("Empty response from AI model")
-                    if attempts < max_attempts:
-                        continue
-                    return jsonify({"error": "Empty response from AI model"}), 500
-
-                # Extract JSON from response
-                result_text = response.text.strip()
-                json_text = extract_json_from_text(result_text)
-                
-                if not json_text:
-                    logging.error(f"Could not find JSON array in response: {result_text[:100]}...")
-                    if attempts < max_attempts:
-                        continue
-                    return jsonify({"error": "Could not find JSON array in response"}), 500
-
-                # Try to fix JSON formatting issues
-                json_text = fix_json_format(json_text)
-                
-                # Parse JSON
-                try:
-                    quiz = json.loads(json_text)
-                except json.JSONDecodeError as e:
-                    logging.error(f"JSON decode error: {str(e)} in text: {json_text[:100]}...")
-                    if attempts < max_attempts:
-                        continue
-                    return jsonify({"error": "Failed to parse AI response as JSON"}), 500
-                
-                # Validate and fix quiz structure
-                validated_quiz = validate_and_fix_quiz(quiz)
-                if not validated_quiz:
-                    logging.error("Failed to validate quiz structure")
-                    if attempts < max_attempts:
-                        continue
-                    return jsonify({"error": "Invalid quiz structure"}), 500
-                
-                # Ensure we have exactly 10 questions
-                if len(validated_quiz) < 10:
-                    # If we don't have enough questions, try again
-                    if attempts < max_attempts:
-                        continue
-                    
-                    # On final attempt, pad with generic questions if needed
-                    while len(validated_quiz) < 10:
-                        validated_quiz.append({
-                            "question": f"Additional question about {text}?",
-                            "options": ["Option A", "Option B", "Option C", "Option D"],
-                            "correct": "Option A"
-                        })
-                elif len(validated_quiz) > 10:
-                    # Trim excess questions
-                    validated_quiz = validated_quiz[:10]
-                
-                # Save quiz to file
-                try:
-                    quiz_path = os.path.join(quizzes_dir, 'generated_quiz.json')
-                    with open(quiz_path, 'w') as f:
-                        json.dump(validated_quiz, f, indent=2)
-                except Exception as e:
-                    logging.error(f"Failed to save quiz to file: {str(e)}")
-                    # Continue even if saving fails
-                
-                return jsonify(validated_quiz)
+        # Assemble the prompt from the precomputed scaffold
+        head = _TOPIC_PROMPT_HEAD if len(text.split()) <= 3 else _TEXT_PROMPT_HEAD
+        prompt = head + text + _PROMPT_RULES
 
-            except Exception as e:
-                logging.error(f"Attempt {attempts} error: {str(e)}")
-                if attempts >= max_attempts:
-                    return jsonify({"error": "Failed to generate quiz after multiple attempts"}), 500
-                # Continue to next attempt
+        quiz, error = await _call_gemini_for_quiz(prompt, text)
+        if error:
+            message, status = error
+            return jsonify({"error": message}), status
+
+        # Cache the result in the background; the response doesn't wait on
+        # the embedding call
+        app.add_background_task(quiz_cache.put, text, quiz, embedding)
+
+        return jsonify(quiz)
 
     except Exception as e:
         logging.error(f"Unexpected error: {str(e)}")
         return jsonify({"error": "An unexpected error occurred. Please try again."}), 500
 
+@app.route('/generate-quiz-batch', methods=['POST'])
+async def generate_quiz_batch():
+    try:
+        # Input validation
+        data = await request.get_json()
+        if not data or 'texts' not in data or not isinstance(data['texts'], list):
+            return jsonify({"error": "Missing 'texts' field"}), 400
+
+        texts = [t.strip() for t in data['texts'] if isinstance(t, str) and t.strip()]
+        if not texts:
+            return jsonify({"error": "Text inputs cannot be empty"}), 400
+
+        loop = asyncio.get_running_loop()
+        quizzes = []
+        pending = []  # (index, text, future) for cache misses
+        # Probe the cache for all texts concurrently so later misses aren't
+        # enqueued after the coalescing window has already closed
+        cache_results = await asyncio.gather(*(quiz_cache.get(text) for text in texts))
+        for i, (text, (cached_quiz, embedding)) in enumerate(zip(texts, cache_results)):
+            quizzes.append(cached_quiz)
+            if cached_quiz is None:
+                future = loop.create_future()
+                await _batch_queue.put((text, future))
+                pending.append((i, text, embedding, future))
+
+        for i, text, embedding, future in pending:
+            quiz = await future
+            if quiz is not None:
+                app.add_background_task(quiz_cache.put, text, quiz, embedding)
+            quizzes[i] = quiz
+
+        if all(quiz is None for quiz in quizzes):
+            return jsonify({"error": "Failed to generate quizzes"}), 500
+
+        # Entries that could not be generated are returned as null
+        return jsonify({"quizzes": quizzes})
+
+    except Exception as e:
+        logging.error(f"Unexpected error in batch generation: {str(e)}")
+        return jsonify({"error": "An unexpected error occurred. Please try again."}), 500
+
+# Only this many characters of extracted text are sent to Gemini
+_PDF_TEXT_LIMIT = 5000
+
+# Maximum accepted upload size (10MB)
+_PDF_MAX_BYTES = 10 * 1024 * 1024
+
+def _extract_pdf_text(pdf_bytes):
+    """Extract text from in-memory PDF bytes (runs in a worker thread).
+
+    Stops reading pages once the character limit is reached, so work is
+    bounded regardless of PDF length.
+    """
+    parts = []
+    total = 0
+    doc = fitz.open(stream=pdf_bytes, filetype="pdf")
+    for page in doc:
+        page_text = page.get_text("text")
+        parts.append(page_text)
+        total += len(page_text)
+        if total >= _PDF_TEXT_LIMIT:
+            break
+    doc.close()
+    return "".join(parts)[:_PDF_TEXT_LIMIT]
+
 @app.route('/api/generate-quiz-from-pdf', methods=['POST'])
-def generate_quiz_from_pdf():
+async def generate_quiz_from_pdf():
     try:
         # Check if the request has a file part
-        if 'pdf' not in request.files:
+        files = await request.files
+        if 'pdf' not in files:
             return jsonify({"error": "No PDF file provided"}), 400
-            
-        pdf_file = request.files['pdf']
+
+        pdf_file = files['pdf']
         
         # If user does not select file, browser might submit an empty file
         if pdf_file.filename == '':
@@ -279,28 +634,18 @@ def generate_quiz_from_pdf():
             return jsonify({"error": "Uploaded file is not a PDF"}), 400
             
         # Get additional topic context if provided
-        topic_context = request.form.get('topic', '')
-        
-        # Create a unique filename to avoid collisions
-        unique_filename = f"{uuid.uuid4().hex}_{secure_filename(pdf_file.filename)}"
-        pdf_path = os.path.join(uploads_dir, unique_filename)
-        
+        form = await request.form
+        topic_context = form.get('topic', '')
+
         try:
-            # Save the file temporarily
-            pdf_file.save(pdf_path)
-            
-            # Check file size (max 10MB)
-            if os.path.getsize(pdf_path) > 10 * 1024 * 1024:
-                os.remove(pdf_path)  # Clean up
+            # Read the upload into memory; no temp file needed (max 10MB)
+            pdf_bytes = pdf_file.read(_PDF_MAX_BYTES + 1)
+            if len(pdf_bytes) > _PDF_MAX_BYTES:
                 return jsonify({"error": "PDF file size exceeds 10MB limit"}), 400
-                
-            # Extract text from PDF
-            extracted_text = ""
+
+            # Extract text from PDF off the event loop (PyMuPDF is CPU-bound)
             try:
-                doc = fitz.open(pdf_path)
-                for page in doc:
-                    extracted_text += page.get_text()
-                doc.close()
+                extracted_text = await asyncio.to_thread(_extract_pdf_text, pdf_bytes)
             except Exception as e:
                 logging.error(f"PDF extraction error: {str(e)}")
                 return jsonify({"error": "Failed to extract text from PDF"}), 400
@@ -308,130 +653,32 @@ def generate_quiz_from_pdf():
             # Check if any text was extracted
             if not extracted_text.strip():
                 return jsonify({"error": "No text found in PDF, please upload a text-based PDF"}), 400
-                
-            # Limit text to 5000 characters
-            extracted_text = extracted_text[:5000]
-            
-            # Prepare prompt for Gemini API
-            prompt = f"""
-            Create a quiz with 10 multiple-choice questions based on this text extracted from a PDF:
-            {extracted_text}
-            
-            {f'Additional context: {topic_context}' if topic_context else ''}
-            
-            Return the quiz in ONLY this JSON format with no other text:
-            [
-                {{
-                    "question": "Question text here?",
-                    "options": ["Option A", "Option B", "Option C", "Option D"],
-                    "correct": "Option that is correct (must match exactly one item in options array)"  
-                }},
-                ... 9 more similar question objects
-            ]
-            
-            Important rules:
-            1. Return EXACTLY 10 questions
-            2. Each question MUST have EXACTLY 4 options
-            3. The correct answer MUST be one of the options
-            4. DO NOT include any markdown formatting, explanations, or any text outside the JSON array
-            5. Use simple JSON without any special formatting
-            """
-            
-            # Generate quiz with extended retries
-            attempts = 0
-            max_attempts = 3
-            while attempts < max_attempts:
-                try:
-                    attempts += 1
-                    response = model.generate_content(
-                        prompt, 
-                        generation_config={"temperature": 0.2}  # Lower temperature for more consistent formatting
-                    )
-                    
-                    if not response.text:
-                        logging.error("Empty response from AI model")
-                        if attempts < max_attempts:
-                            continue
-                        return jsonify({"error": "Empty response from AI model"}), 500
-
-                    # Extract JSON from response
-                    result_text = response.text.strip()
-                    json_text = extract_json_from_text(result_text)
-                    
-                    if not json_text:
-                        logging.error(f"Could not find JSON array in response: {result_text[:100]}...")
-                        if attempts < max_attempts:
-                            continue
-                        return jsonify({"error": "Could not find JSON array in response"}), 500
-
-                    # Try to fix JSON formatting issues
-                    json_text = fix_json_format(json_text)
-                    
-                    # Parse JSON
-                    try:
-                        quiz = json.loads(json_text)
-                    except json.JSONDecodeError as e:
-                        logging.error(f"JSON decode error: {str(e)} in text: {json_text[:100]}...")
-                        if attempts < max_attempts:
-                            continue
-                        return jsonify({"error": "Failed to parse AI response as JSON"}), 500
-                    
-                    # Validate and fix quiz structure
-                    validated_quiz = validate_and_fix_quiz(quiz)
-                    if not validated_quiz:
-                        logging.error("Failed to validate quiz structure")
-                        if attempts < max_attempts:
-                            continue
-                        return jsonify({"error": "Invalid quiz structure"}), 500
-                    
-                    # Ensure we have exactly 10 questions
-                    if len(validated_quiz) < 10:
-                        # If we don't have enough questions, try again
-                        if attempts < max_attempts:
-                            continue
-                        
-                        # On final attempt, pad with generic questions if needed
-                        while len(validated_quiz) < 10:
-                            validated_quiz.append({
-                                "question": f"Additional question about the PDF content?",
-                                "options": ["Option A", "Option B", "Option C", "Option D"],
-                                "correct": "Option A"
-                            })
-                    elif len(validated_quiz) > 10:
-                        # Trim excess questions
-                        validated_quiz = validated_quiz[:10]
-                    
-                    # Save quiz to file
-                    try:
-                        quiz_path = os.path.join(quizzes_dir, 'generated_quiz.json')
-                        with open(quiz_path, 'w') as f:
-                            json.dump(validated_quiz, f, indent=2)
-                    except Exception as e:
-                        logging.error(f"Failed to save quiz to file: {str(e)}")
-                        # Continue even if saving fails
-                    
-                    return jsonify(validated_quiz)
-
-                except Exception as e:
-                    logging.error(f"Attempt {attempts} error: {str(e)}")
-                    if attempts >= max_attempts:
-                        return jsonify({"error": "Failed to generate quiz after multiple attempts"}), 500
-                    # Continue to next attempt
+
+            # Assemble the prompt from the precomputed scaffold
+            prompt = _PDF_PROMPT_HEAD + extracted_text
+            if topic_context:
+                prompt += f"\n\nAdditional context: {topic_context}"
+            prompt += _PROMPT_RULES
+
+
+            quiz, error = await _call_gemini_for_quiz(prompt, "the PDF content")
+            if error:
+                message, status = error
+                return jsonify({"error": message}), status
+
+            return jsonify(quiz)
 
         except Exception as e:
             logging.error(f"PDF processing error: {str(e)}")
             return jsonify({"error": "Failed to process PDF file"}), 500
-        finally:
-            # Clean up the temporary file
-            if os.path.exists(pdf_path):
-                try:
-                    os.remove(pdf_path)
-                except Exception as e:
-                    logging.error(f"Failed to remove temporary PDF file: {str(e)}")
 
     except Exception as e:
         logging.error(f"Unexpected error in PDF processing: {str(e)}")
         return jsonify({"error": "An unexpected error occurred. Please try again."}), 500
 
+# Development server only; in production run under an ASGI server, e.g.
+#   hypercorn api:app --bind 0.0.0.0:5000 --workers 4
+# Debug mode (with its reloader child that re-runs every import side effect)
+# is opt-in via DEBUG=1
 if __name__ == '__main__':
-    app.run(host='0.0.0.0', port=5000, debug=True)
\ No newline at end of file
+    app.run(host='0.0.0.0', port=5000, debug=os.getenv('DEBUG') == '1')
\ No newline at end of file